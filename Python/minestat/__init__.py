@@ -15,12 +15,83 @@
 # You should have received a copy of the GNU General Public License along
 # with this program; if not, write to the Free Software Foundation, Inc.,
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
-import json
 import socket
 import struct
-from time import perf_counter
+from copy import copy
+from threading import Lock
+from time import monotonic, perf_counter_ns
 from enum import Enum
-from typing import Union
+from typing import BinaryIO, Iterable, List, Tuple, Union
+
+# Use orjson for the JSON payload if it is installed, it parses the raw bytes directly
+try:
+  from orjson import loads as _json_loads
+except ImportError:
+  from json import loads as _json_loads
+
+# Request of the MC 1.4 & 1.5 (legacy) ping: 0xFE 0x01 as packet id
+_PING_LEGACY = b"\xFE\x01"
+# Request of the MC Beta 1.8 to Release 1.3 (beta) ping: 0xFE as packet id
+_PING_BETA = b"\xFE"
+# Static start of the MC 1.6 (extended legacy) ping request: 0xFE 0x01 as packet id,
+# 0xFA as plugin message id and the 'MC|PingHost' channel as length-prefixed UTF-16BE string
+_PING_HOST = "MC|PingHost".encode("utf-16-be")
+_PING_EXTENDED_LEGACY = b"\xFE\x01\xFA" + struct.pack(">h", len(_PING_HOST) // 2) + _PING_HOST
+# Empty "Request" packet of the MC 1.7+ (JSON) query: varint length 1, 0x00 as packet id
+_JSON_STATUS_REQUEST = b"\x01\x00"
+# Upper bound of the JSON status length, generous even for a large server icon
+_JSON_MAX_PAYLOAD = 2_000_000
+
+# Precompiled struct formats
+# Answer header of the legacy pings: packet id (skipped) and payload length (signed big-endian short)
+_LEGACY_HEADER = struct.Struct(">xh")
+# Server port in the JSON handshake (unsigned big-endian short)
+_PORT_U16 = struct.Struct(">H")
+# Rest of the extended legacy ping request after the hostname: server port (big-endian int)
+_PORT_I32 = struct.Struct(">i")
+# Extended legacy ping request before the hostname: byte count of the rest of the data,
+# protocol version and strlen of the hostname
+_PING_HOST_HEADER = struct.Struct(">hBh")
+
+# Cache of resolved server addresses: (address, port) -> (expiry time, getaddrinfo() result)
+_RESOLVE_CACHE = {}
+_RESOLVE_CACHE_LOCK = Lock()
+_RESOLVE_CACHE_TTL = 60       # seconds until a resolved address is looked up again
+_RESOLVE_CACHE_SIZE = 256     # maximum number of cached addresses
+
+def _resolve(address: str, port: int) -> Tuple[tuple, ...]:
+  """
+  Resolve the TCP addresses of a server, cached for `_RESOLVE_CACHE_TTL` seconds.
+  Saves the DNS lookup when the same server is queried repeatedly, e.g. when polling,
+  while still picking up DNS changes in long running processes.
+
+  Failed lookups raise `socket.gaierror` and are not cached.
+
+  :param address: Hostname or IP address of the server
+  :param port: Port of the server
+  :return: The result of `socket.getaddrinfo()`
+  """
+  key = (address, port)
+  now = monotonic()
+
+  with _RESOLVE_CACHE_LOCK:
+    entry = _RESOLVE_CACHE.get(key)
+  if entry is not None and entry[0] > now:
+    return entry[1]
+
+  # Resolve without holding the lock, so lookups of other servers are not blocked
+  addrinfo = tuple(socket.getaddrinfo(address, port, type=socket.SOCK_STREAM))
+
+  with _RESOLVE_CACHE_LOCK:
+    _RESOLVE_CACHE.pop(key, None)
+    if len(_RESOLVE_CACHE) >= _RESOLVE_CACHE_SIZE:
+      # Drop expired entries, or else the oldest one
+      expired = [k for k, (expiry, _) in _RESOLVE_CACHE.items() if expiry <= now]
+      for k in expired or [next(iter(_RESOLVE_CACHE))]:
+        del _RESOLVE_CACHE[k]
+    _RESOLVE_CACHE[key] = (now + _RESOLVE_CACHE_TTL, addrinfo)
+
+  return addrinfo
 
 class ConnStatus(Enum):
   """
@@ -30,6 +101,7 @@ Contains possible connection states.
 - `CONNFAIL`: The socket to the server could not be established. Server offline, wrong hostname or port?
 - `TIMEOUT`: The connection timed out. (Server under too much load? Firewall rules OK?)
 - `UNKNOWN`: The connection was established, but the server spoke an unknown/unsupported SLP protocol.
+- `CONNFAIL_DNS`: The server address could not be resolved. Wrong hostname? DNS issues?
   """
 
   def __str__(self):
@@ -47,6 +119,9 @@ Contains possible connection states.
   UNKNOWN = -3
   """The connection was established, but the server spoke an unknown/unsupported SLP protocol."""
 
+  CONNFAIL_DNS = -4
+  """The server address could not be resolved. (Wrong hostname? DNS issues?)"""
+
 class SlpProtocols(Enum):
   """
 Contains possible SLP (Server List Ping) protocols.
@@ -123,6 +198,11 @@ class MineStat:
   VERSION = "2.1.1"             # MineStat version
   DEFAULT_TIMEOUT = 5           # default TCP timeout in seconds
 
+  # Used by `_query_concurrently()` to abort the queries it no longer waits for:
+  # the sockets opened by a query running in a worker thread, and whether it was abandoned
+  _probe_socks = None
+  _abandoned = False
+
   def __init__(self, address, port, timeout = DEFAULT_TIMEOUT, query_protocol: SlpProtocols = None):
     self.address = address
     self.port = port
@@ -131,52 +211,231 @@ class MineStat:
     self.motd = None             # message of the day
     self.current_players = None  # current number of players online
     self.max_players = None      # maximum player capacity
-    self.latency = None          # ping time to server in milliseconds
+    self.latency = None          # lowest ping time to server in milliseconds
     self.timeout = timeout       # socket timeout
     self.slp_protocol = None     # Server List Ping protocol
 
-    # Future improvement: IPv4/IPv6, multiple addresses
-    # If a host has multiple IP addresses or a IPv4 and a IPv6 address,
-    # socket.connect choses the first IPv4 address returned by DNS.
-    # If a mc server is not available over IPv4, this failes as "offline".
-    # Or in some environments, the DNS returns the external and the internal
-    # address, but from an internal client, only the internal address is reachable
-    # See https://docs.python.org/3/library/socket.html#socket.getaddrinfo
+    # The hostname as UTF-8 and UTF-16BE encoded string, as used by the JSON and extended legacy query
+    self._address_utf8 = address.encode("utf8")
+    self._address_utf16be = address.encode("utf-16-be")
+
+    # The requests of the JSON query only depend on address and port, so build them once
+    self._json_handshake = self._build_json_handshake()
+
+    # Resolve the address only once, all queries connect to the same addresses.
+    # This includes IPv6 addresses and hosts with multiple addresses, see _connect().
+    try:
+      self._addrinfo = _resolve(address, port)
+    except socket.gaierror:
+      # Unknown hostname, every query will fail to connect
+      self._addrinfo = ()
 
     # If the user wants a specific protocol, use only that.
     if query_protocol:
-      if query_protocol is SlpProtocols.BETA:
-        self.beta_query()
-      elif query_protocol is SlpProtocols.LEGACY:
-        self.legacy_query()
-      elif query_protocol is SlpProtocols.EXTENDED_LEGACY:
-        self.extended_legacy_query()
-      elif query_protocol is SlpProtocols.JSON:
-        self.json_query()
-
+      getattr(self, self._QUERIES[query_protocol])()
       return
 
-    # Note: The order here is unfortunately important.
-    # Some older versions of MC don't accept packets for a few seconds
-    # after receiving a not understood packet.
-    # An example is MC 1.4: Nothing works directly after a json request.
-    # A legacy query alone works fine.
+    # Otherwise run through the cascade, until a stage ends it
+    for queries in self._CASCADE:
+      result = self._query_concurrently(*queries)
 
-    # Minecraft 1.4 & 1.5 (legacy SLP)
-    result = self.legacy_query()
+      if result in self._TERMINAL:
+        break
 
-    # Minecraft Beta 1.8 to Release 1.3 (beta SLP)
-    if result is not ConnStatus.CONNFAIL \
-        and result is not ConnStatus.SUCCESS:
-      result = self.beta_query()
+      # If not even the connection could be established in time (no latency measured),
+      # a later stage would only wait for the same timeout again
+      if result is ConnStatus.TIMEOUT and self.latency is None:
+        break
 
-    # Minecraft 1.6 (extended legacy SLP)
-    if result is not ConnStatus.CONNFAIL:
-      result = self.extended_legacy_query()
+  @classmethod
+  async def async_create(cls, address, port, timeout = DEFAULT_TIMEOUT,
+                         query_protocol: SlpProtocols = None, executor = None) -> 'MineStat':
+    """
+    Queries the status of a server without blocking the running asyncio event loop.
+    The query runs in a worker thread of `executor`, the other arguments are the same as for `MineStat()`.
 
-    # Minecraft 1.7+ (JSON SLP)
-    if result is not ConnStatus.CONNFAIL:
-      self.json_query()
+    The number of servers queried at the same time is bounded by the number of worker threads.
+    The default executor of the loop only has `min(32, os.cpu_count() + 4)` of them, so pass
+    a larger executor (e.g. a `concurrent.futures.ThreadPoolExecutor`) to query many servers at once.
+
+    ```python
+    ms = await minestat.MineStat.async_create('minecraft.frag.land', 25565)
+    ```
+
+    :param executor: The `concurrent.futures.Executor` to run the query in, defaults to the default executor of the loop
+    :return: The `MineStat` object of the server
+    """
+    # Imported here, as it is only needed by asyncio users
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, cls, address, port, timeout, query_protocol)
+
+  def _query_concurrently(self, *queries) -> ConnStatus:
+    """
+    Helper method for running several SLP queries at the same time.
+
+    Every query runs in its own thread against a copy of this object, so the queries don't
+    overwrite each other's results. The results of the first successful query (in the given
+    order of preference) are taken over, as soon as all more preferred queries have failed.
+    Less preferred queries still running at that point are aborted by shutting down their
+    connections, so their threads end right away. A single query is run directly.
+
+    Exceptions raised by a query are passed on to the caller; malformed answers don't raise,
+    the queries report them as `UNKNOWN` themselves.
+
+    :param queries: The names of the query methods (e.g. `'legacy_query'`), most preferred first
+    :return: The result of the query that got the furthest, in this order:
+             `SUCCESS`, `UNKNOWN`, `TIMEOUT`, `CONNFAIL`, `CONNFAIL_DNS`
+    """
+    if len(queries) == 1:
+      return getattr(self, queries[0])()
+
+    # Imported here, as it pulls in `logging` and is only needed when querying all protocols
+    from concurrent.futures import ThreadPoolExecutor
+
+    probes = [copy(self) for _ in queries]
+    for probe in probes:
+      probe._probe_socks = []
+
+    executor = ThreadPoolExecutor(max_workers=len(queries))
+    futures = []
+    try:
+      for query, probe in zip(queries, probes):
+        futures.append(executor.submit(getattr(probe, query)))
+
+      # Wait for the queries in order of preference, until one of them succeeds
+      results = []
+      for future, probe in zip(futures, probes):
+        result = future.result()
+        results.append(result)
+
+        if result is ConnStatus.SUCCESS:
+          self.__dict__.update((name, value) for name, value in probe.__dict__.items()
+                               if name not in ("_probe_socks", "_abandoned"))
+          break
+    finally:
+      # Abort the queries still running. Shutting down their connections wakes them up
+      # from connect() or recv(), see also _connect().
+      for future, probe in zip(futures, probes):
+        probe._abandoned = True
+        if not future.done():
+          for sock in probe._probe_socks:
+            try:
+              sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+              # Not connected (yet) or already closed
+              pass
+
+      executor.shutdown(wait=False)
+
+    # All queries connected to the same server, keep the lowest latency any of them measured
+    latencies = [probe.latency for probe in probes if probe.latency is not None]
+    if latencies:
+      self.latency = min(latencies)
+
+    # Report the result of the query that got the furthest
+    for result in (ConnStatus.SUCCESS, ConnStatus.UNKNOWN, ConnStatus.TIMEOUT, ConnStatus.CONNFAIL):
+      if result in results:
+        return result
+
+    return results[0]
+
+  def _make_sock(self, family: int, socktype: int, proto: int) -> socket.socket:
+    """
+    Helper method for creating a socket for the SLP queries.
+
+    :param family: The address family, as returned by `socket.getaddrinfo()`
+    :param socktype: The socket type, as returned by `socket.getaddrinfo()`
+    :param proto: The protocol number, as returned by `socket.getaddrinfo()`
+    :return: The new, unconnected socket
+    """
+    sock = socket.socket(family, socktype, proto)
+    sock.settimeout(self.timeout)
+
+    # The SLP requests are tiny, send them right away instead of waiting for
+    # Nagle's algorithm to coalesce them.
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    # Linux only: Let the kernel drop the connection if sent data stays unacknowledged
+    # for longer than the timeout, instead of retransmitting for several minutes.
+    if self.timeout and hasattr(socket, "TCP_USER_TIMEOUT"):
+      sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_USER_TIMEOUT, int(self.timeout * 1000))
+
+    return sock
+
+  def _connect(self) -> socket.socket:
+    """
+    Helper method for connecting to the server and measuring the latency.
+    If several connections are made, `latency` holds the lowest measured value.
+
+    The resolved addresses of the server are tried in order, until a connection could be established.
+
+    :return: The connected socket
+    :raise OSError: No connection could be established (`socket.timeout` if the last attempt timed out)
+    """
+    if not self._addrinfo:
+      raise socket.gaierror("Unable to resolve %s" % self.address)
+
+    for family, socktype, proto, _, sockaddr in self._addrinfo:
+      sock = None
+      try:
+        # Creating the socket fails as well, e.g. for IPv6 addresses if IPv6 is disabled
+        sock = self._make_sock(family, socktype, proto)
+
+        # Let _query_concurrently() abort the connection, once it no longer waits for this query
+        if self._probe_socks is not None:
+          self._probe_socks.append(sock)
+          if self._abandoned:
+            raise OSError("Query abandoned")
+
+        start_time = perf_counter_ns()
+        sock.connect(sockaddr)
+
+        # The query may have been abandoned while connecting
+        if self._abandoned:
+          raise OSError("Query abandoned")
+      except OSError as e:
+        if sock is not None:
+          sock.close()
+        error = e
+        continue
+
+      # Every query connects on its own, keep the lowest latency measured so far
+      latency = (perf_counter_ns() - start_time) // 1000000
+      if self.latency is None or latency < self.latency:
+        self.latency = latency
+
+      return sock
+
+    raise error
+
+  def _build_json_handshake(self) -> bytes:
+    """
+    Helper method for building the client requests of the JSON query:
+    the Handshake packet, followed by the empty "Request" packet.
+
+    :return: The requests, ready to be sent
+    """
+    # Construct Handshake packet
+    req_data = b"".join((
+      # Packet id 0x00
+      b"\x00",
+      # Add protocol version. If pinging to determine version, use `-1`
+      self._pack_varint(0),
+      # Add server address length, in bytes
+      self._pack_varint(len(self._address_utf8)),
+      # Server address. Encoded with UTF8
+      self._address_utf8,
+      # Server port
+      _PORT_U16.pack(self.port),
+      # Next packet state (1 for status, 2 for login)
+      b"\x01",
+    ))
+
+    # Prepend full packet length and append the empty "Request" packet,
+    # so both are sent at once
+    return b"".join((self._pack_varint(len(req_data)), req_data, _JSON_STATUS_REQUEST))
 
   def json_query(self):
     """
@@ -186,59 +445,44 @@ class MineStat:
 
     See https://wiki.vg/Server_List_Ping#Current
     """
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.settimeout(self.timeout)
-
     try:
-      start_time = perf_counter()
-      sock.connect((self.address, self.port))
-      self.latency = round((perf_counter() - start_time) * 1000)
+      sock = self._connect()
     except socket.timeout:
       return ConnStatus.TIMEOUT
+    except socket.gaierror:
+      return ConnStatus.CONNFAIL_DNS
     except OSError:
       return ConnStatus.CONNFAIL
 
-    # Construct Handshake packet
-    req_data = bytearray([0x00])
-    # Add protocol version. If pinging to determine version, use `-1`
-    req_data += self._pack_varint(0)
-    # Add server address length
-    req_data += self._pack_varint(len(self.address))
-    # Server address. Encoded with UTF8
-    req_data += bytearray(self.address, "utf8")
-    # Server port
-    req_data += struct.pack(">H", self.port)
-    # Next packet state (1 for status, 2 for login)
-    req_data += bytearray([0x01])
-
-    # Prepend full packet length
-    req_data = self._pack_varint(len(req_data)) + req_data
-
-    # Now actually send the constructed client request
-    sock.send(req_data)
-
-    # Now send empty "Request" packet
-    # varint len, 0x00
-    sock.send(bytearray([0x01, 0x00]))
-
-    # Receive answer: full packet lenght as varint
     try:
-      packet_len = self._unpack_varint(sock)
+      # Buffered reader, so small reads don't each need a recv() call
+      with sock, sock.makefile('rb') as reader:
+        # Now actually send the prebuilt client requests
+        sock.sendall(self._json_handshake)
+
+        # Receive answer: full packet lenght as varint
+        packet_len = self._unpack_varint(reader)
+
+        # Receive actual packet id
+        packet_id = self._unpack_varint(reader)
+
+        # Receive & unpack payload length
+        content_len = self._unpack_varint(reader)
+
+        # Don't wait for (and allocate) absurd amounts of data from a misbehaving server
+        if content_len < 3 or content_len > _JSON_MAX_PAYLOAD:
+          return ConnStatus.UNKNOWN
+
+        # Receive full payload
+        payload_raw = self._recv_exact(reader, content_len)
     except socket.timeout:
       return ConnStatus.TIMEOUT
+    except EOFError:
+      # The server closed the connection without a (complete) answer
+      return ConnStatus.UNKNOWN
     except OSError:
       return ConnStatus.CONNFAIL
 
-    # Receive actual packet id
-    packet_id = self._unpack_varint(sock)
-
-    # Receive & unpack payload length
-    content_len = self._unpack_varint(sock)
-
-    # Receive full payload and close socket
-    payload_raw = bytearray(sock.recv(content_len * 2))
-    sock.close()
-
     # If we receive a packet with id 0x19, something went wrong.
     # Usually the payload is JSON text, telling us what exactly.
     # We could stop here, and display something to the user, as this is not normal
@@ -262,30 +506,58 @@ class MineStat:
     :param payload_raw: The raw SLP payload, without header and string lenght
     """
     try:
-      payload_obj = json.loads(payload_raw.decode('utf8'))
-    except json.JSONDecodeError:
+      # Both parsers take the UTF-8 encoded bytes, invalid UTF-8 or JSON raises a ValueError
+      payload_obj = _json_loads(payload_raw)
+    except ValueError:
+      return ConnStatus.UNKNOWN
+
+    try:
+      version = payload_obj["version"]["name"]
+      motd = payload_obj["description"]["text"]
+      max_players = payload_obj["players"]["max"]
+      current_players = payload_obj["players"]["online"]
+    except (KeyError, TypeError):
+      # Missing fields, or a status object not shaped as expected (e.g. a plain string as description)
       return ConnStatus.UNKNOWN
 
     # Now that we have the status object, set all fields
-    self.version = payload_obj["version"]["name"]
-    self.motd = payload_obj["description"]["text"]
-    self.max_players = payload_obj["players"]["max"]
-    self.current_players = payload_obj["players"]["online"]
+    self.version = version
+    self.motd = motd
+    self.max_players = max_players
+    self.current_players = current_players
 
     # If we got here, everything is in order.
     self.online = True
     return ConnStatus.SUCCESS
 
-  def _unpack_varint(self, sock: socket.socket):
-    """ Small helper method for unpacking an int from an varint (streamed from socket). """
-    data = 0
-    for i in range(5):
-      ordinal = sock.recv(1)
+  def _unpack_varint(self, reader: BinaryIO):
+    """ Small helper method for unpacking an int from an varint (streamed from a buffered socket reader). """
+    ordinal = reader.read(1)
+    if len(ordinal) == 0:
+      return 0
+
+    # Fast path: packet ids and lengths mostly fit into one or two bytes
+    data = ordinal[0]
+    if not data & 0x80:
+      return data
+
+    ordinal = reader.read(1)
+    if len(ordinal) == 0:
+      return data & 0x7F
+
+    byte = ordinal[0]
+    data = (data & 0x7F) | (byte & 0x7F) << 7
+    if not byte & 0x80:
+      return data
+
+    # Longer varints, up to 5 bytes
+    for i in range(2, 5):
+      ordinal = reader.read(1)
 
       if len(ordinal) == 0:
         break
 
-      byte = ord(ordinal)
+      byte = ordinal[0]
       data |= (byte & 0x7F) << 7 * i
 
       if not byte & 0x80:
@@ -293,19 +565,43 @@ class MineStat:
 
     return data
 
+  def _recv_exact(self, reader: BinaryIO, size: int) -> bytearray:
+    """
+    Small helper method for receiving exactly `size` bytes from a socket.
+
+    `socket.recv()` may return less data than requested, e.g. if the answer is split
+    into several TCP segments. The buffered reader keeps reading into one preallocated buffer
+    until it is full. Consecutive small reads (like header and payload) are usually served
+    from a single `recv()` call.
+
+    :param reader: Buffered reader of the connected socket, see `socket.makefile()`
+    :param size: The number of bytes to receive
+    :return: The received data
+    :raise EOFError: The connection was closed before all data was received
+    """
+    data = bytearray(size)
+    received = reader.readinto(data)
+
+    if received != size:
+      raise EOFError("Connection closed after %d of %d bytes" % (received, size))
+
+    return data
+
   def _pack_varint(self, data):
-    """ Small helper method for packing a varint from an int. """
-    ordinal = b''
+    """ Small helper method for packing a varint from an int (up to 32 bit, i.e. max. 5 bytes). """
+    ordinal = bytearray(5)
+    length = 0
 
     while True:
       byte = data & 0x7F
       data >>= 7
-      ordinal += struct.pack('B', byte | (0x80 if data > 0 else 0))
+      ordinal[length] = byte | 0x80 if data else byte
+      length += 1
 
-      if data == 0:
+      if not data:
         break
 
-    return ordinal
+    return bytes(ordinal[:length])
 
   def extended_legacy_query(self):
     """
@@ -315,58 +611,58 @@ class MineStat:
     See https://wiki.vg/Server_List_Ping#1.6
     :return:
     """
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.settimeout(self.timeout)
-
-    try:
-      start_time = perf_counter()
-      sock.connect((self.address, self.port))
-      self.latency = round((perf_counter() - start_time) * 1000)
-    except socket.timeout:
-      return ConnStatus.TIMEOUT
-    except OSError:
-      return ConnStatus.CONNFAIL
-
-    # Send 0xFE as packet identifier,
+    # Build the request from the static prefix:
+    # 0xFE as packet identifier,
     # 0x01 as ping packet content
     # 0xFA as packet identifier for a plugin message
     # 0x00 0x0B as strlen of following string
-    req_data = bytearray([0xFE, 0x01, 0xFA, 0x00, 0x0B])
     # the string 'MC|PingHost' as UTF-16BE encoded string
-    req_data += bytearray("MC|PingHost", "utf-16-be")
+    # and the dynamic part:
     # 0xXX 0xXX byte count of rest of data, 7+len(serverhostname), as short
-    req_data += struct.pack(">h", 7 + (len(self.address) * 2))
     # 0xXX [legacy] protocol version (before netty rewrite)
     # Used here: 74 (MC 1.6.2)
-    req_data += bytearray([0x49])
     # strlen of serverhostname (big-endian short)
-    req_data += struct.pack(">h", len(self.address))
     # the hostname of the server
-    req_data += bytearray(self.address, "utf-16-be")
     # port of the server, as int (4 byte)
-    req_data += struct.pack(">i", self.port)
-
-    # Now send the contructed client requests
-    sock.send(req_data)
+    address = self._address_utf16be
+    req_data = b"".join((_PING_EXTENDED_LEGACY,
+                         _PING_HOST_HEADER.pack(7 + len(address), 0x49, len(address) // 2),
+                         address,
+                         _PORT_I32.pack(self.port)))
 
-    # Receive answer packet id (1 byte) and payload lengh (signed big-endian short; 2 byte)
     try:
-      raw_header = sock.recv(3)
+      sock = self._connect()
     except socket.timeout:
       return ConnStatus.TIMEOUT
+    except socket.gaierror:
+      return ConnStatus.CONNFAIL_DNS
     except OSError:
       return ConnStatus.CONNFAIL
 
-    # Extract payload length
-    # Might be empty, if the server keeps the connection open but doesn't send anything
     try:
-      content_len = struct.unpack(">xh", raw_header)[0]
-    except struct.error:
+      # Buffered reader, so small reads don't each need a recv() call
+      with sock, sock.makefile('rb') as reader:
+        # Now send the contructed client requests
+        sock.sendall(req_data)
+
+        # Receive answer packet id (1 byte) and payload lengh (signed big-endian short; 2 byte)
+        raw_header = self._recv_exact(reader, 3)
+
+        # Extract payload length
+        content_len = _LEGACY_HEADER.unpack(raw_header)[0]
+        # The length is signed, a negative one can't be valid
+        if content_len < 0:
+          return ConnStatus.UNKNOWN
+
+        # Receive full payload (UTF-16BE, 2 bytes per character)
+        payload_raw = self._recv_exact(reader, content_len * 2)
+    except socket.timeout:
+      return ConnStatus.TIMEOUT
+    except EOFError:
+      # The server closed the connection without a (complete) answer
       return ConnStatus.UNKNOWN
-
-    # Receive full payload and close socket
-    payload_raw = bytearray(sock.recv(content_len * 2))
-    sock.close()
+    except OSError:
+      return ConnStatus.CONNFAIL
 
     # Set protocol version
     self.slp_protocol = SlpProtocols.EXTENDED_LEGACY
@@ -382,40 +678,40 @@ class MineStat:
 
     :return: ConnStatus
     """
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.settimeout(self.timeout)
-
     try:
-      start_time = perf_counter()
-      sock.connect((self.address, self.port))
-      self.latency = round((perf_counter() - start_time) * 1000)
+      sock = self._connect()
     except socket.timeout:
       return ConnStatus.TIMEOUT
+    except socket.gaierror:
+      return ConnStatus.CONNFAIL_DNS
     except OSError:
       return ConnStatus.CONNFAIL
 
-    # Send 0xFE 0x01 as packet id
-    sock.send(bytearray([0xFE, 0x01]))
-
-    # Receive answer packet id (1 byte) and payload lengh (signed big-endian short; 2 byte)
     try:
-      raw_header = sock.recv(3)
+      # Buffered reader, so small reads don't each need a recv() call
+      with sock, sock.makefile('rb') as reader:
+        # Send 0xFE 0x01 as packet id
+        sock.sendall(_PING_LEGACY)
+
+        # Receive answer packet id (1 byte) and payload lengh (signed big-endian short; 2 byte)
+        raw_header = self._recv_exact(reader, 3)
+
+        # Extract payload length
+        content_len = _LEGACY_HEADER.unpack(raw_header)[0]
+        # The length is signed, a negative one can't be valid
+        if content_len < 0:
+          return ConnStatus.UNKNOWN
+
+        # Receive full payload (UTF-16BE, 2 bytes per character)
+        payload_raw = self._recv_exact(reader, content_len * 2)
     except socket.timeout:
       return ConnStatus.TIMEOUT
+    except EOFError:
+      # The server closed the connection without a (complete) answer
+      return ConnStatus.UNKNOWN
     except OSError:
       return ConnStatus.CONNFAIL
 
-    # Extract payload length
-    # Might be empty, if the server keeps the connection open but doesn't send anything
-    try:
-      content_len = struct.unpack(">xh", raw_header)[0]
-    except struct.error:
-      return ConnStatus.UNKNOWN
-
-    # Receive full payload and close socket
-    payload_raw = bytearray(sock.recv(content_len * 2))
-    sock.close()
-
     # Set protocol version
     self.slp_protocol = SlpProtocols.LEGACY
 
@@ -429,8 +725,6 @@ class MineStat:
     :param payload_raw: The extracted legacy SLP payload as bytearray/bytes
     """
     # According to wiki.vg, beta, legacy and extended legacy use UTF-16BE as "payload" encoding
-    payload_str = payload_raw.decode('utf-16-be')
-
     # This "payload" contains six fields delimited by a NUL character:
     # - a fixed prefix '§1'
     # - the protocol version
@@ -438,27 +732,68 @@ class MineStat:
     # - the MOTD
     # - the online player count
     # - the max player count
-    payload_list = payload_str.split('\x00')
+    # Instead of decoding the whole payload, locate the NUL characters (two zero bytes
+    # at an even offset) in the raw data and only decode the fields that are used.
+    fields = []
+    start = 0
+    position = payload_raw.find(b"\x00\x00")
+    while position != -1:
+      if position % 2:
+        # The zero bytes belong to two adjacent characters, e.g. U+0100 U+0041
+        position = payload_raw.find(b"\x00\x00", position + 1)
+        continue
+
+      fields.append(slice(start, position))
+      start = position + 2
+      position = payload_raw.find(b"\x00\x00", start)
+    fields.append(slice(start, len(payload_raw)))
 
     # Check for count of string parts, expected is 6 for this protocol version
-    if len(payload_list) != 6:
+    if len(fields) != 6:
       return ConnStatus.UNKNOWN
 
-    # - a fixed prefix '§1'
-    # - the protocol version
-    # - the server version
-    self.version = payload_list[2]
-    # - the MOTD
-    self.motd = payload_list[3]
-    # - the online player count
-    self.current_players = int(payload_list[4])
-    # - the max player count
-    self.max_players = int(payload_list[5])
+    try:
+      # - a fixed prefix '§1'
+      # - the protocol version
+      # - the server version
+      version = payload_raw[fields[2]].decode('utf-16-be')
+      # - the MOTD
+      motd = payload_raw[fields[3]].decode('utf-16-be')
+      # - the online player count
+      current_players = self.__parse_legacy_int(payload_raw[fields[4]])
+      # - the max player count
+      max_players = self.__parse_legacy_int(payload_raw[fields[5]])
+    except ValueError:
+      # Invalid UTF-16 or player counts which aren't numbers
+      return ConnStatus.UNKNOWN
+
+    self.version = version
+    self.motd = motd
+    self.current_players = current_players
+    self.max_players = max_players
 
     # If we got here, everything is in order
     self.online = True
     return ConnStatus.SUCCESS
 
+  def __parse_legacy_int(self, field_raw: Union[bytearray, bytes]) -> int:
+    """
+    Internal helper method for parsing a number (e.g. the player count) from a legacy SLP payload field.
+
+    Numbers are sent as ASCII digits, which are a zero byte followed by the ASCII byte in UTF-16BE.
+    In that case only the ASCII bytes are parsed, without decoding the field.
+    Anything else (e.g. padding with Unicode whitespace) is decoded and parsed like `int()` does.
+
+    :param field_raw: The UTF-16BE encoded field
+    :return: The parsed number
+    """
+    digits = field_raw[1::2]
+    if digits.isdigit() and not field_raw[0::2].strip(b"\x00"):
+      return int(digits)
+
+    # Not only ASCII digits, decode the field properly
+    return int(field_raw.decode('utf-16-be'))
+
   def beta_query(self):
     """
     Minecraft Beta 1.8 to Release 1.3 SLP protocol
@@ -467,62 +802,73 @@ class MineStat:
     :return: ConnStatus
     """
 
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.settimeout(self.timeout)
-
     try:
-      start_time = perf_counter()
-      sock.connect((self.address, self.port))
-      self.latency = round((perf_counter() - start_time) * 1000)
+      sock = self._connect()
     except socket.timeout:
       return ConnStatus.TIMEOUT
+    except socket.gaierror:
+      return ConnStatus.CONNFAIL_DNS
     except OSError:
       return ConnStatus.CONNFAIL
 
-    # Send 0xFE as packet id
-    sock.send(bytearray([0xFE]))
-
-    # Receive answer packet id (1 byte) and payload lengh (signed big-endian short; 2 byte)
     try:
-      raw_header = sock.recv(3)
+      # Buffered reader, so small reads don't each need a recv() call
+      with sock, sock.makefile('rb') as reader:
+        # Send 0xFE as packet id
+        sock.sendall(_PING_BETA)
+
+        # Receive answer packet id (1 byte) and payload lengh (signed big-endian short; 2 byte)
+        raw_header = self._recv_exact(reader, 3)
+
+        # Extract payload length
+        content_len = _LEGACY_HEADER.unpack(raw_header)[0]
+        # The length is signed, a negative one can't be valid
+        if content_len < 0:
+          return ConnStatus.UNKNOWN
+
+        # Receive full payload (UTF-16BE, 2 bytes per character)
+        payload_raw = self._recv_exact(reader, content_len * 2)
     except socket.timeout:
       return ConnStatus.TIMEOUT
+    except EOFError:
+      # The server closed the connection without a (complete) answer
+      return ConnStatus.UNKNOWN
     except OSError:
       return ConnStatus.CONNFAIL
 
-    # Extract payload length
-    # Might be empty, if the server keeps the connection open but doesn't send anything
-    try:
-      content_len = struct.unpack(">xh", raw_header)[0]
-    except struct.error:
-      return ConnStatus.UNKNOWN
-
-    # Receive full payload and close socket
-    payload_raw = bytearray(sock.recv(content_len * 2))
-    sock.close()
-
     # Set protocol version
     self.slp_protocol = SlpProtocols.BETA
 
-    # According to wiki.vg, beta, legacy and extended legacy use UTF-16BE as "payload" encoding
-    payload_str = payload_raw.decode('utf-16-be')
-    # This "payload" contains three values:
+    # This "payload" contains three values, delimited by '§':
     # The MOTD, the max player count, and the online player count
-    payload_list = payload_str.split('§')
+    # Without at least two '§' (0x00 0xA7 in UTF-16BE), this is most probably an error message,
+    # e.g. 'Protocol error'. Check for that on the raw data, before decoding it.
+    if payload_raw.count(b"\x00\xa7") < 2:
+      return ConnStatus.UNKNOWN
 
-    # Check for count of string parts, expected is 3 for this protocol version
-    # Note: We could check here if the list has the len() one, as that is most probably an error message.
-    # e.g. ['Protocol error']
-    if len(payload_list) < 3:
+    try:
+      # According to wiki.vg, beta, legacy and extended legacy use UTF-16BE as "payload" encoding
+      payload_str = payload_raw.decode('utf-16-be')
+      # The MOTD could contain '§' itself, so only split at the last two
+      payload_list = payload_str.rsplit('§', 2)
+
+      # Check for count of string parts, expected is 3 for this protocol version
+      if len(payload_list) != 3:
+        return ConnStatus.UNKNOWN
+
+      # The first value it the server MOTD,
+      # the second value is the online player count,
+      # the last value is the max player count
+      motd, current_players, max_players = payload_list
+      current_players = int(current_players)
+      max_players = int(max_players)
+    except ValueError:
+      # Invalid UTF-16 or player counts which aren't numbers
       return ConnStatus.UNKNOWN
 
-    # The last value is the max player count
-    self.max_players = int(payload_list[-1])
-    # The second(-to-last) value is the online player count
-    self.current_players = int(payload_list[-2])
-    # The first value it the server MOTD
-    # This could contain '§' itself, thats the reason for the join here
-    self.motd = "§".join(payload_list[:-2])
+    self.motd = motd
+    self.current_players = current_players
+    self.max_players = max_players
 
     # Set general version, as the protocol doesn't contain the server version
     self.version = ">=1.8b/1.3"
@@ -531,3 +877,89 @@ class MineStat:
     self.online = True
 
     return ConnStatus.SUCCESS
+
+  # The name of the query method for each protocol, used if a specific `query_protocol` is requested.
+  # Names instead of the functions themselves, so overrides in subclasses are honoured.
+  _QUERIES = {
+    SlpProtocols.JSON: "json_query",
+    SlpProtocols.EXTENDED_LEGACY: "extended_legacy_query",
+    SlpProtocols.LEGACY: "legacy_query",
+    SlpProtocols.BETA: "beta_query",
+  }
+
+  # Note: The order here is unfortunately important.
+  # Some older versions of MC don't accept packets for a few seconds
+  # after receiving a not understood packet.
+  # An example is MC 1.4: Nothing works directly after a json request.
+  # A legacy query alone works fine.
+  # The legacy pings all start with 0xFE and are understood by every server
+  # version, so they are sent concurrently. The JSON query follows afterwards.
+  # Successful later stages overwrite the results of earlier ones, as they contain more details.
+  _CASCADE = (
+    # Minecraft 1.6 (extended legacy SLP), 1.4 & 1.5 (legacy SLP)
+    # and Beta 1.8 to Release 1.3 (beta SLP), most preferred first
+    ("extended_legacy_query", "legacy_query", "beta_query"),
+    # Minecraft 1.7+ (JSON SLP)
+    ("json_query",),
+  )
+
+  # Results of a cascade stage, after which the following stages are skipped
+  _TERMINAL = frozenset({ConnStatus.CONNFAIL, ConnStatus.CONNFAIL_DNS})
+
+class MineStatBatch:
+  """
+  Queries the status of many Minecraft servers concurrently.
+
+  The servers are queried by a pool of worker threads, which is reused for all batches.
+  Its size bounds the number of servers queried at the same time.
+
+  A server whose answer can't be parsed doesn't abort the batch: like an unreachable server,
+  it is reported with `online` set to `None`. Other errors, e.g. an invalid target, are raised
+  by `query()`.
+
+  ```python
+  with minestat.MineStatBatch(concurrency=64) as batch:
+    for ms in batch.query([('minecraft.frag.land', 25565), ('localhost', 25565)]):
+      print('%s:%d online: %s' % (ms.address, ms.port, ms.online))
+  ```
+  """
+  DEFAULT_CONCURRENCY = 64      # default number of servers queried at the same time
+
+  def __init__(self, concurrency = DEFAULT_CONCURRENCY, timeout = MineStat.DEFAULT_TIMEOUT,
+               query_protocol: SlpProtocols = None):
+    self.concurrency = concurrency        # maximum number of servers queried at the same time
+    self.timeout = timeout                # socket timeout
+    self.query_protocol = query_protocol  # specific SLP protocol to use, see `MineStat`
+    self._executor = None                 # worker thread pool, created on first use
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+
+  def query(self, targets: Iterable[Tuple[str, int]]) -> List[MineStat]:
+    """
+    Queries the status of all given servers.
+
+    :param targets: The servers to query, as `(address, port)` tuples
+    :return: One `MineStat` object per server, in the order of `targets`.
+             Servers that failed to be queried have `online` set to `None`.
+    """
+    if self._executor is None:
+      # Imported here, as it pulls in `logging`
+      from concurrent.futures import ThreadPoolExecutor
+      self._executor = ThreadPoolExecutor(max_workers=self.concurrency)
+
+    return list(self._executor.map(self._query_one, targets))
+
+  def close(self):
+    """ Shuts down the worker threads. """
+    if self._executor is not None:
+      self._executor.shutdown()
+      self._executor = None
+
+  def _query_one(self, target: Tuple[str, int]) -> MineStat:
+    """ Small helper method for querying a single server in a worker thread. """
+    address, port = target
+    return MineStat(address, port, self.timeout, self.query_protocol)
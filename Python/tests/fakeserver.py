@@ -0,0 +1,127 @@
+"""
+Minimal fake Minecraft servers for the tests, listening on localhost.
+
+The packets are built here independently of minestat, so the tests don't
+verify the library against itself.
+"""
+import json
+import socket
+import threading
+import time
+
+
+def legacy_answer(payload: str) -> bytes:
+  """ Kick packet of the beta/legacy/extended legacy pings: 0xFF, length in UTF-16 code units, UTF-16BE payload. """
+  payload_raw = payload.encode("utf-16-be")
+  return b"\xff" + (len(payload_raw) // 2).to_bytes(2, "big") + payload_raw
+
+
+def varint(value: int) -> bytes:
+  """ Encodes an unsigned int as varint. """
+  data = b""
+  while True:
+    byte = value & 0x7F
+    value >>= 7
+    if value:
+      data += bytes([byte | 0x80])
+    else:
+      return data + bytes([byte])
+
+
+def json_answer(status) -> bytes:
+  """ Status response packet of the JSON query for the given status object (or raw bytes). """
+  payload = status if isinstance(status, bytes) else json.dumps(status).encode("utf8")
+  packet = b"\x00" + varint(len(payload)) + payload
+  return varint(len(packet)) + packet
+
+
+class FakeServer:
+  """
+  Answers the SLP pings like a real server would.
+
+  :param legacy: Answer to the legacy and extended legacy pings (0xFE 0x01 ...), `None` to close the connection
+  :param beta: Answer to the beta ping (a single 0xFE), `None` to close the connection
+  :param status: Answer to the JSON query, `None` to close the connection
+  :param chunk: Send answers in pieces of this many bytes, to simulate fragmented TCP segments
+  :param silent_beta: Keep the connection open without answering the beta ping
+  """
+  def __init__(self, legacy: bytes = None, beta: bytes = None, status: bytes = None,
+               chunk: int = None, silent_beta: bool = False):
+    self.legacy = legacy
+    self.beta = beta
+    self.status = status
+    self.chunk = chunk
+    self.silent_beta = silent_beta
+    self.requests = []
+
+    self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    self._sock.bind(("127.0.0.1", 0))
+    self._sock.listen(32)
+    self.port = self._sock.getsockname()[1]
+
+    self._closed = threading.Event()
+    threading.Thread(target=self._accept, daemon=True).start()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+
+  def close(self):
+    self._closed.set()
+    self._sock.close()
+
+  def _accept(self):
+    while not self._closed.is_set():
+      try:
+        conn, _ = self._sock.accept()
+      except OSError:
+        return
+      threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+  def _handle(self, conn: socket.socket):
+    with conn:
+      conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+      conn.settimeout(5)
+      try:
+        request = conn.recv(1)
+        if request == b"\xfe":
+          # Legacy pings are sent with a single sendall(), so the rest (if any) follows right away
+          conn.settimeout(0.1)
+          try:
+            request += conn.recv(4096)
+          except socket.timeout:
+            pass
+          conn.settimeout(5)
+
+          if request == b"\xfe":
+            if self.silent_beta:
+              self._closed.wait(5)
+              return
+            answer = self.beta
+          else:
+            answer = self.legacy
+        else:
+          # JSON query: Handshake followed by the empty "Request" packet
+          while not request.endswith(b"\x01\x00"):
+            data = conn.recv(4096)
+            if not data:
+              return
+            request += data
+          answer = self.status
+
+        self.requests.append(request)
+        if answer is not None:
+          self._send(conn, answer)
+      except OSError:
+        pass
+
+  def _send(self, conn: socket.socket, answer: bytes):
+    if not self.chunk:
+      conn.sendall(answer)
+      return
+
+    for start in range(0, len(answer), self.chunk):
+      conn.sendall(answer[start:start + self.chunk])
+      time.sleep(0.01)
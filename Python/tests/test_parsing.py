@@ -0,0 +1,134 @@
+import io
+import random
+import unittest
+
+import minestat
+from minestat import ConnStatus, MineStat
+
+from .fakeserver import varint
+
+
+def parse_legacy_reference(payload_raw: bytes):
+  """ The original legacy payload parser: decode everything, then split at NUL. Invalid data counts as UNKNOWN. """
+  try:
+    payload_list = payload_raw.decode("utf-16-be").split("\x00")
+    if len(payload_list) != 6:
+      return ConnStatus.UNKNOWN, None
+    return ConnStatus.SUCCESS, (payload_list[2], payload_list[3], int(payload_list[4]), int(payload_list[5]))
+  except ValueError:
+    return ConnStatus.UNKNOWN, None
+
+
+def new_minestat() -> MineStat:
+  """ A MineStat object without running any query. """
+  ms = MineStat.__new__(MineStat)
+  ms.online = ms.version = ms.motd = ms.current_players = ms.max_players = None
+  return ms
+
+
+# Payloads of the legacy pings, as decoded text
+LEGACY_PAYLOADS = [
+  "§1\x0047\x001.4.7\x00A Minecraft Server\x003\x0020",
+  "§1\x0074\x001.6.4\x00\x000\x000",
+  "§1\x0074\x001.6.4\x00§aHello §bWorld\x0012\x00100",
+  # U+0100 U+0041 contains two zero bytes at an odd offset, which are no delimiter
+  "§1\x0074\x001.6.4\x00ĀA䄀\x005\x0050",
+  "§1\x0074\x00Ā\x00äöü ☃ \U0001F600\x005\x0050",
+  # Player counts with whitespace, as accepted by int()
+  "§1\x0074\x001.6.4\x00motd\x00 5\x00\xa050",
+  "§1\x0074\x001.6.4\x00motd\x00\x855\x00\x1c50",
+  # Too few or too many fields
+  "§1\x0074\x001.6.4\x00motd\x005",
+  "§1\x0074\x001.6.4\x00motd\x005\x0050\x00extra",
+  "",
+  # Invalid player counts
+  "§1\x0074\x001.6.4\x00motd\x00?\x0050",
+  "§1\x0074\x001.6.4\x00motd\x005\x00",
+  "§1\x0074\x001.6.4\x00motd\x00٥\x0050",
+]
+
+
+class LegacyPayloadTest(unittest.TestCase):
+  def test_matches_reference_parser(self):
+    for payload in LEGACY_PAYLOADS:
+      with self.subTest(payload=payload):
+        payload_raw = payload.encode("utf-16-be")
+        expected = parse_legacy_reference(payload_raw)
+
+        ms = new_minestat()
+        result = ms._MineStat__parse_legacy_payload(payload_raw)
+        self.assertEqual(result, expected[0])
+        if result is ConnStatus.SUCCESS:
+          self.assertTrue(ms.online)
+          self.assertEqual((ms.version, ms.motd, ms.current_players, ms.max_players), expected[1])
+        else:
+          # Nothing is taken over from an invalid payload
+          self.assertEqual((ms.online, ms.version, ms.motd, ms.current_players, ms.max_players), (None,) * 5)
+
+  def test_invalid_utf16(self):
+    # A lone high surrogate as MOTD
+    payload_raw = "§1\x0074\x001.6.4\x00".encode("utf-16-be") + b"\xd8\x00" + "\x005\x0050".encode("utf-16-be")
+    self.assertEqual(new_minestat()._MineStat__parse_legacy_payload(payload_raw), ConnStatus.UNKNOWN)
+
+  def test_bytearray_payload(self):
+    ms = new_minestat()
+    payload_raw = bytearray(LEGACY_PAYLOADS[0].encode("utf-16-be"))
+    self.assertEqual(ms._MineStat__parse_legacy_payload(payload_raw), ConnStatus.SUCCESS)
+    self.assertEqual(ms.current_players, 3)
+
+
+class LegacyIntTest(unittest.TestCase):
+  def test_matches_int(self):
+    parse = new_minestat()._MineStat__parse_legacy_int
+    for text in ["0", "5", "20", "007", " 5 ", "\t7\n", "\xa05", "\x855", "\x1c5", "+5", "-3", "1_0",
+                 "٣", "²", "", "?", "5 5", "0x1", "5　"]:
+      with self.subTest(text=text):
+        try:
+          expected = int(text)
+        except ValueError:
+          with self.assertRaises(ValueError):
+            parse(text.encode("utf-16-be"))
+          continue
+        self.assertEqual(parse(text.encode("utf-16-be")), expected)
+
+
+class VarintTest(unittest.TestCase):
+  VALUES = [0, 1, 127, 128, 255, 300, 16383, 16384, 2 ** 21 - 1, 2 ** 21, 2 ** 28 - 1, 2 ** 28, 2 ** 32 - 1]
+
+  def setUp(self):
+    self.ms = new_minestat()
+    self.values = self.VALUES + [random.Random(0).getrandbits(32) for _ in range(500)]
+
+  def test_pack(self):
+    for value in self.values:
+      self.assertEqual(self.ms._pack_varint(value), varint(value))
+
+  def test_round_trip(self):
+    for value in self.values:
+      reader = io.BytesIO(self.ms._pack_varint(value) + b"\xff")
+      self.assertEqual(self.ms._unpack_varint(reader), value)
+      # Exactly the varint is consumed
+      self.assertEqual(reader.read(), b"\xff")
+
+  def test_truncated(self):
+    self.assertEqual(self.ms._unpack_varint(io.BytesIO(b"")), 0)
+    self.assertEqual(self.ms._unpack_varint(io.BytesIO(b"\x80")), 0)
+    self.assertEqual(self.ms._unpack_varint(io.BytesIO(b"\xac")), 0x2c)
+    self.assertEqual(self.ms._unpack_varint(io.BytesIO(b"\xac\x82")), 0x2c | 2 << 7)
+
+
+class JsonPayloadTest(unittest.TestCase):
+  def test_invalid_payloads(self):
+    for payload_raw in [b"{", b"\xff{}", bytearray(b"["), b"[]", b"{}", b'"text"',
+                        b'{"version": {"name": "1.20.1"}, "description": "plain MOTD",'
+                        b' "players": {"max": 100, "online": 7}}']:
+      with self.subTest(payload_raw=payload_raw):
+        ms = new_minestat()
+        self.assertEqual(ms._MineStat__parse_json_payload(payload_raw), ConnStatus.UNKNOWN)
+        self.assertIsNone(ms.version)
+
+  def test_stdlib_and_orjson_agree(self):
+    import json
+    payload_raw = '{"version": {"name": "1.20.1"}, "description": {"text": "é ☃"},' \
+                  ' "players": {"max": 100, "online": 7}}'.encode("utf8")
+    self.assertEqual(minestat._json_loads(payload_raw), json.loads(payload_raw.decode("utf8")))
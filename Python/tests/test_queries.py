@@ -0,0 +1,267 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from minestat import ConnStatus, MineStat, MineStatBatch, SlpProtocols
+
+from .fakeserver import FakeServer, json_answer, legacy_answer
+
+
+STATUS = {
+  "version": {"name": "1.20.1", "protocol": 763},
+  "players": {"max": 100, "online": 7},
+  "description": {"text": "JSON MOTD é"},
+  # Large enough to span several TCP segments
+  "favicon": "data:image/png;base64," + "A" * 20000,
+}
+LEGACY = legacy_answer("§1\x0074\x001.6.4\x00Legacy MOTD\x005\x0050")
+BETA = legacy_answer("Beta MOTD§3§20")
+
+
+def beta_reference(payload: str):
+  """ The original beta payload parser: split at every '§', then join the MOTD again. Invalid data counts as UNKNOWN. """
+  payload_list = payload.split("§")
+  if len(payload_list) < 3:
+    return ConnStatus.UNKNOWN, None
+  try:
+    return ConnStatus.SUCCESS, ("§".join(payload_list[:-2]), int(payload_list[-2]), int(payload_list[-1]))
+  except ValueError:
+    return ConnStatus.UNKNOWN, None
+
+
+class ConnStatusTest(unittest.TestCase):
+  def test_plain_enum(self):
+    # Unlike IntEnum members, SUCCESS (value 0) must neither be falsy nor equal to 0
+    self.assertTrue(all(ConnStatus))
+    self.assertNotEqual(ConnStatus.SUCCESS, 0)
+    self.assertEqual(str(ConnStatus.SUCCESS), "SUCCESS")
+
+
+class QueryTest(unittest.TestCase):
+  def test_json_server(self):
+    with FakeServer(legacy=LEGACY, status=json_answer(STATUS)) as server:
+      ms = MineStat("localhost", server.port, 2)
+    self.assertTrue(ms.online)
+    self.assertEqual(ms.slp_protocol, SlpProtocols.JSON)
+    self.assertEqual((ms.version, ms.motd, ms.current_players, ms.max_players), ("1.20.1", "JSON MOTD é", 7, 100))
+    self.assertIsNotNone(ms.latency)
+
+  def test_legacy_server(self):
+    with FakeServer(legacy=LEGACY, beta=BETA) as server:
+      ms = MineStat("127.0.0.1", server.port, 2)
+    self.assertTrue(ms.online)
+    self.assertEqual(ms.slp_protocol, SlpProtocols.EXTENDED_LEGACY)
+    self.assertEqual((ms.version, ms.motd, ms.current_players, ms.max_players), ("1.6.4", "Legacy MOTD", 5, 50))
+
+  def test_beta_server(self):
+    with FakeServer(beta=BETA) as server:
+      ms = MineStat("127.0.0.1", server.port, 2)
+    self.assertTrue(ms.online)
+    self.assertEqual(ms.slp_protocol, SlpProtocols.BETA)
+    self.assertEqual((ms.version, ms.motd, ms.current_players, ms.max_players), (">=1.8b/1.3", "Beta MOTD", 3, 20))
+
+  def test_fragmented_answers(self):
+    with FakeServer(legacy=LEGACY, beta=BETA, status=json_answer(STATUS), chunk=700) as server:
+      for protocol in SlpProtocols:
+        with self.subTest(protocol=protocol):
+          ms = MineStat("127.0.0.1", server.port, 2, protocol)
+          self.assertTrue(ms.online)
+          self.assertEqual(ms.slp_protocol, protocol)
+
+  def test_truncated_answers(self):
+    with FakeServer(legacy=LEGACY[:-4], beta=BETA[:5], status=json_answer(STATUS)[:-10]) as server:
+      for protocol in SlpProtocols:
+        with self.subTest(protocol=protocol):
+          ms = MineStat("127.0.0.1", server.port, 2, protocol)
+          self.assertIsNone(ms.online)
+
+  def test_beta_matches_reference_parser(self):
+    for payload in ["Beta MOTD§3§20", "§aColored §bMOTD§0§10", "§3§20", "MOTD§20", "", "MOTD§x§20",
+                    "Protocol error"]:
+      with self.subTest(payload=payload):
+        expected = beta_reference(payload)
+        with FakeServer(beta=legacy_answer(payload)) as server:
+          ms = MineStat("127.0.0.1", server.port, 2, SlpProtocols.BETA)
+
+        if expected[0] is ConnStatus.SUCCESS:
+          self.assertTrue(ms.online)
+          self.assertEqual((ms.motd, ms.current_players, ms.max_players), expected[1])
+        else:
+          self.assertIsNone(ms.online)
+          self.assertIsNone(ms.motd)
+
+  def test_negative_legacy_length(self):
+    answer = b"\xff\xff\xfe" + "§3§20".encode("utf-16-be")
+    with FakeServer(legacy=answer, beta=answer) as server:
+      for protocol in (SlpProtocols.EXTENDED_LEGACY, SlpProtocols.LEGACY, SlpProtocols.BETA):
+        with self.subTest(protocol=protocol):
+          ms = MineStat("127.0.0.1", server.port, 2, protocol)
+          self.assertIsNone(ms.online)
+          self.assertEqual(getattr(ms, MineStat._QUERIES[protocol])(), ConnStatus.UNKNOWN)
+
+  def test_unexpected_json_status(self):
+    status = dict(STATUS, description="plain MOTD")
+    with FakeServer(legacy=LEGACY, status=json_answer(status)) as server:
+      ms = MineStat("127.0.0.1", server.port, 2, SlpProtocols.JSON)
+      self.assertIsNone(ms.online)
+      self.assertEqual(ms.json_query(), ConnStatus.UNKNOWN)
+
+      # All protocols: the legacy answer is kept
+      ms = MineStat("127.0.0.1", server.port, 2)
+      self.assertTrue(ms.online)
+      self.assertEqual((ms.version, ms.motd), ("1.6.4", "Legacy MOTD"))
+
+  def test_json_length_bound(self):
+    # Announces a payload of almost 256 MB, without sending it
+    answer = b"\x06\x00\xff\xff\xff\x7f"
+    with FakeServer(status=answer) as server:
+      start = time.perf_counter()
+      ms = MineStat("127.0.0.1", server.port, 3, SlpProtocols.JSON)
+    self.assertIsNone(ms.online)
+    self.assertLess(time.perf_counter() - start, 1)
+
+  def test_handshake_uses_encoded_address_length(self):
+    address = "bücher.example"
+    ms = MineStat.__new__(MineStat)
+    ms.port = 25565
+    ms._address_utf8 = address.encode("utf8")
+    handshake = ms._build_json_handshake()
+    # Packet length, packet id, protocol version, then the length of the UTF-8 encoded address
+    self.assertEqual(handshake[3], len(address.encode("utf8")))
+    self.assertEqual(handshake[4:4 + handshake[3]], address.encode("utf8"))
+    self.assertEqual(handshake[-2:], b"\x01\x00")
+
+  def test_next_address_if_socket_creation_fails(self):
+    addrinfo = (
+      (socket.AF_INET6, socket.SOCK_STREAM, 6, "", ("::1", 0, 0, 0)),
+      (socket.AF_INET, socket.SOCK_STREAM, 6, "", ("127.0.0.1", 0)),
+    )
+    real_socket = socket.socket
+
+    def no_ipv6_socket(family=socket.AF_INET, *args, **kwargs):
+      if family == socket.AF_INET6:
+        raise OSError(97, "Address family not supported by protocol")
+      return real_socket(family, *args, **kwargs)
+
+    with FakeServer(legacy=LEGACY) as server:
+      addrinfo = tuple(info[:4] + ((info[4][0], server.port) + info[4][2:],) for info in addrinfo)
+      with mock.patch("minestat._resolve", return_value=addrinfo), mock.patch("socket.socket", no_ipv6_socket):
+        ms = MineStat("localhost", server.port, 2, SlpProtocols.LEGACY)
+    self.assertTrue(ms.online)
+
+  def test_connection_refused(self):
+    with FakeServer() as server:
+      port = server.port
+    ms = MineStat("127.0.0.1", port, 1)
+    self.assertIsNone(ms.online)
+
+
+class CascadeTest(unittest.TestCase):
+  def test_formatted_1_4_answer_to_every_ping(self):
+    # A 1.4 server answers the beta ping in the legacy format as well, beta_query can't parse that
+    answer = legacy_answer("§1\x0047\x001.4.7\x00§aHello §bWorld\x003\x0020")
+    with FakeServer(legacy=answer, beta=answer) as server:
+      ms = MineStat("127.0.0.1", server.port, 2)
+    self.assertTrue(ms.online)
+    self.assertEqual(ms.motd, "§aHello §bWorld")
+
+  def test_beta_probe_errors_alone(self):
+    # Only the beta ping is answered, with an invalid player count
+    with FakeServer(beta=legacy_answer("MOTD§?§20")) as server:
+      ms = MineStat("127.0.0.1", server.port, 2)
+    self.assertIsNone(ms.online)
+
+  def test_no_wait_for_less_preferred_probes(self):
+    with FakeServer(legacy=LEGACY, silent_beta=True) as server:
+      start = time.perf_counter()
+      ms = MineStat("127.0.0.1", server.port, 3)
+    self.assertTrue(ms.online)
+    self.assertLess(time.perf_counter() - start, 1.5)
+
+  def test_abandoned_probes_end(self):
+    # The beta probe gets no answer and is abandoned, its thread must not keep the process alive
+    script = "import minestat; print(minestat.MineStat('127.0.0.1', %d, 4).online)"
+    with FakeServer(legacy=LEGACY, silent_beta=True) as server:
+      start = time.perf_counter()
+      output = subprocess.run([sys.executable, "-c", script % server.port], check=True, stdout=subprocess.PIPE,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    self.assertEqual(output.stdout.strip(), b"True")
+    self.assertLess(time.perf_counter() - start, 2)
+
+  def test_json_after_legacy_pings(self):
+    with FakeServer(legacy=LEGACY, status=json_answer(STATUS)) as server:
+      MineStat("127.0.0.1", server.port, 2)
+    # The JSON query must not be sent before the legacy pings got an answer (MC 1.4)
+    json_requests = [i for i, request in enumerate(server.requests) if request[0] != 0xFE]
+    extended_legacy_requests = [i for i, request in enumerate(server.requests) if request[:3] == b"\xfe\x01\xfa"]
+    self.assertEqual(len(json_requests), 1)
+    self.assertLess(extended_legacy_requests[0], json_requests[0])
+
+  def test_subclass_override(self):
+    class MyMineStat(MineStat):
+      def json_query(self):
+        result = super().json_query()
+        self.motd = "overridden"
+        return result
+
+    with FakeServer(legacy=LEGACY, status=json_answer(STATUS)) as server:
+      self.assertEqual(MyMineStat("127.0.0.1", server.port, 2).motd, "overridden")
+      self.assertEqual(MyMineStat("127.0.0.1", server.port, 2, SlpProtocols.JSON).motd, "overridden")
+
+
+  def test_errors_in_overrides_raise(self):
+    class BrokenMineStat(MineStat):
+      def extended_legacy_query(self):
+        return self.no_such_attribute
+
+    with FakeServer(legacy=LEGACY) as server:
+      with self.assertRaises(AttributeError):
+        BrokenMineStat("127.0.0.1", server.port, 2)
+
+
+class BatchTest(unittest.TestCase):
+  def test_malformed_server(self):
+    answer = legacy_answer("§1\x0074\x001.6.4\x00motd\x00?\x0050")
+    with FakeServer(legacy=LEGACY, status=json_answer(STATUS)) as good, FakeServer(legacy=answer, beta=answer) as bad:
+      targets = [("127.0.0.1", good.port)] * 5 + [("127.0.0.1", bad.port)]
+      for query_protocol in (None, SlpProtocols.LEGACY):
+        with self.subTest(query_protocol=query_protocol), MineStatBatch(query_protocol=query_protocol) as batch:
+          results = batch.query(targets)
+
+          self.assertEqual([ms.port for ms in results], [port for _, port in targets])
+          self.assertEqual([ms.online for ms in results], [True] * 5 + [None])
+          self.assertIsNone(results[-1].version)
+
+  def test_invalid_target(self):
+    with FakeServer(legacy=LEGACY) as server, MineStatBatch(query_protocol=SlpProtocols.LEGACY) as batch:
+      # Raised by MineStat() itself, instead of reporting the server as offline
+      with self.assertRaises(AttributeError):
+        batch.query([("127.0.0.1", server.port), (None, 25565)])
+
+
+class AsyncCreateTest(unittest.TestCase):
+  def test_executor(self):
+    async def query_all(executor, port):
+      return await asyncio.gather(*(MineStat.async_create("127.0.0.1", port, 1, SlpProtocols.BETA, executor=executor)
+                                    for _ in range(20)))
+
+    with FakeServer(silent_beta=True) as server, ThreadPoolExecutor(max_workers=20) as executor:
+      start = time.perf_counter()
+      results = asyncio.run(query_all(executor, server.port))
+    self.assertEqual(len(results), 20)
+    self.assertTrue(all(ms.online is None for ms in results))
+    # All queries timed out at the same time
+    self.assertLess(time.perf_counter() - start, 2)
+
+  def test_default_executor(self):
+    async def query(port):
+      return await MineStat.async_create("127.0.0.1", port, 2)
+
+    with FakeServer(legacy=LEGACY, status=json_answer(STATUS)) as server:
+      self.assertTrue(asyncio.run(query(server.port)).online)
@@ -0,0 +1,74 @@
+import socket
+import unittest
+from unittest import mock
+
+import minestat
+from minestat import ConnStatus, MineStat
+
+
+ADDRINFO = [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("127.0.0.1", 25565))]
+
+
+class ResolveTest(unittest.TestCase):
+  def setUp(self):
+    minestat._RESOLVE_CACHE.clear()
+    self.addCleanup(minestat._RESOLVE_CACHE.clear)
+
+    patcher = mock.patch("socket.getaddrinfo", return_value=ADDRINFO)
+    self.getaddrinfo = patcher.start()
+    self.addCleanup(patcher.stop)
+
+    self.now = 1000.0
+    patcher = mock.patch("minestat.monotonic", side_effect=lambda: self.now)
+    patcher.start()
+    self.addCleanup(patcher.stop)
+
+  def test_cached(self):
+    self.assertEqual(minestat._resolve("example.com", 25565), tuple(ADDRINFO))
+    self.assertEqual(minestat._resolve("example.com", 25565), tuple(ADDRINFO))
+    self.assertEqual(self.getaddrinfo.call_count, 1)
+
+    # Other ports are resolved separately
+    minestat._resolve("example.com", 25566)
+    self.assertEqual(self.getaddrinfo.call_count, 2)
+
+  def test_expiry(self):
+    minestat._resolve("example.com", 25565)
+    self.now += minestat._RESOLVE_CACHE_TTL - 1
+    minestat._resolve("example.com", 25565)
+    self.assertEqual(self.getaddrinfo.call_count, 1)
+
+    self.now += 1
+    minestat._resolve("example.com", 25565)
+    self.assertEqual(self.getaddrinfo.call_count, 2)
+
+  def test_failures_not_cached(self):
+    self.getaddrinfo.side_effect = socket.gaierror("unknown host")
+    for _ in range(2):
+      with self.assertRaises(socket.gaierror):
+        minestat._resolve("example.invalid", 25565)
+    self.assertEqual(self.getaddrinfo.call_count, 2)
+    self.assertEqual(minestat._RESOLVE_CACHE, {})
+
+  def test_size_bound(self):
+    with mock.patch("minestat._RESOLVE_CACHE_SIZE", 3):
+      for port in range(3):
+        minestat._resolve("example.com", port)
+      self.now += 1
+
+      # Full, the oldest entry is dropped
+      minestat._resolve("example.com", 3)
+      self.assertEqual(list(minestat._RESOLVE_CACHE), [("example.com", port) for port in (1, 2, 3)])
+
+      # Full with expired entries, all of them are dropped
+      self.now += minestat._RESOLVE_CACHE_TTL
+      minestat._resolve("example.com", 4)
+      self.assertEqual(list(minestat._RESOLVE_CACHE), [("example.com", 4)])
+
+  def test_dns_failure_status(self):
+    self.getaddrinfo.side_effect = socket.gaierror("unknown host")
+    ms = MineStat("example.invalid", 25565, 1)
+    self.assertIsNone(ms.online)
+    for query in ("json_query", "extended_legacy_query", "legacy_query", "beta_query"):
+      with self.subTest(query=query):
+        self.assertEqual(getattr(ms, query)(), ConnStatus.CONNFAIL_DNS)